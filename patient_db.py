@@ -0,0 +1,258 @@
+"""Shared database layer for the Muawin staff app.
+
+All SQLite access (connection setup, patient reads/writes and the
+requests monitor queries) lives here so every page script shares one
+cached connection and one set of helpers.
+"""
+
+import streamlit as st
+import sqlite3
+import pandas as pd
+import functools
+import os
+import threading
+from dotenv import load_dotenv
+import json
+
+# orjson parses a few times faster and dumps ~10x faster for the
+# list-of-strings payloads stored here; fall back to the stdlib when it
+# isn't installed. Both raise ValueError subclasses on bad input.
+try:
+    import orjson
+
+    def jloads(data):
+        return orjson.loads(data)
+
+    def jdumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    jloads = json.loads
+    jdumps = json.dumps
+
+# Load environment variables for local development
+load_dotenv()
+
+# Serializes writes on the shared connection; Streamlit can run scripts
+# for several sessions concurrently against the one cached connection
+_write_lock = threading.Lock()
+
+# Database path - prioritize Streamlit secrets for cloud deployment.
+# Cached so script reloads don't re-stat the secrets TOML file.
+@functools.cache
+def _db_path():
+    try:
+        # Try to get DB path from Streamlit secrets (for cloud deployment)
+        return st.secrets.get("DATABASE_PATH", "muawin.db")
+    except (AttributeError, FileNotFoundError):
+        # Fall back to environment variables or local path (for local development)
+        return os.getenv('DATABASE_PATH', 'muawin.db')
+
+@st.cache_resource
+def get_db_connection():
+    # One long-lived connection shared across reruns so the SQLite page
+    # cache stays hot; check_same_thread=False because Streamlit may call
+    # from different script-run threads.
+    # cached_statements keeps the handful of hot queries prepared between
+    # calls; the helpers always pass identical SQL strings so every call
+    # after the first hits the statement cache.
+    conn = sqlite3.connect(_db_path(), check_same_thread=False, cached_statements=256)
+    conn.row_factory = sqlite3.Row
+    # WAL lets the Requests Monitor keep reading while a save commits, and
+    # the remaining PRAGMAs trade a little durability for far fewer fsyncs
+    # and a larger in-memory page cache.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-64000")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=2147483648")
+    conn.execute("PRAGMA busy_timeout=5000")
+    # One-time index setup so the Requests Monitor filter and its JOIN on
+    # patients stop scanning the whole requests table every refresh.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_id ON requests(status, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_created ON requests(status, created_at DESC)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_patient_id ON requests(patient_id)")
+    # Partial index for the hot open/in_progress filter: most rows end up
+    # closed and are excluded, so this stays tiny and cache-hot
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_open ON requests(status, id) WHERE status != 'closed'")
+    # Covers get_latest_prescription's WHERE patient_id ORDER BY date DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_consult_pat_date ON consultations(patient_id, consultation_date DESC)")
+    conn.commit()
+    return conn
+
+# Common health conditions for checkboxes
+COMMON_CONDITIONS = [
+     "Diabetes", "Hypertension", "Asthma", "COPD", "Heart Disease", 
+            "Stroke", "Cancer", "Arthritis", "Depression", "Anxiety", 
+            "Thyroid Disorder", "Kidney Disease", "Liver Disease", "Obesity",
+            "Allergies", "Epilepsy"
+]
+COMMON_CONDITIONS_SET = frozenset(COMMON_CONDITIONS)
+
+# Common symptoms for checkboxes
+COMMON_SYMPTOMS = [
+    "Fever", "Headache", "Cough", "Sore Throat", "Fatigue", "Nausea",
+    "Vomiting", "Diarrhea", "Abdominal Pain", "Chest Pain", "Shortness of Breath",
+    "Dizziness", "Rash", "Joint Pain", "Back Pain", "Sweating", "Chills"
+]
+COMMON_SYMPTOMS_SET = frozenset(COMMON_SYMPTOMS)
+
+# SQL statements as module-level constants: sqlite3's prepared-statement
+# cache is keyed by the exact SQL text, so reusing the same string
+# objects guarantees cache hits on every call.
+# SQL_GET_PATIENT fetches the patient row and their newest consultation
+# in one round trip; the ranked join seeks idx_consult_pat_date.
+SQL_GET_PATIENT = """
+    SELECT p.id, p.name, p.age, p.gender, p.pre_conditions, p.language, p.symptoms,
+           c.prescription AS latest_prescription,
+           c.consultation_date AS latest_consultation_date,
+           c.diagnosis AS latest_diagnosis
+    FROM patients p
+    LEFT JOIN (
+        SELECT patient_id, prescription, consultation_date, diagnosis,
+               ROW_NUMBER() OVER (
+                   PARTITION BY patient_id ORDER BY consultation_date DESC
+               ) AS rn
+        FROM consultations
+    ) c ON c.patient_id = p.id AND c.rn = 1
+    WHERE p.id = ?
+"""
+SQL_UPSERT_PATIENT = """
+    INSERT INTO patients (
+        id, name, age, gender, pre_conditions, language,
+        temperature, blood_pressure, heart_rate, 
+        respiratory_rate, oxygen_saturation, symptoms
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name, age = excluded.age, gender = excluded.gender,
+        pre_conditions = excluded.pre_conditions, language = excluded.language,
+        temperature = excluded.temperature, blood_pressure = excluded.blood_pressure,
+        heart_rate = excluded.heart_rate, respiratory_rate = excluded.respiratory_rate,
+        oxygen_saturation = excluded.oxygen_saturation, symptoms = excluded.symptoms
+"""
+SQL_GET_REQUESTS_STATUS = """
+    SELECT r.id, r.patient_id, r.request_type, r.status, r.created_at,
+           r.appointment_date, r.notes, p.name as patient_name
+    FROM requests r LEFT JOIN patients p ON r.patient_id = p.id
+    WHERE r.status = ?
+    ORDER BY r.created_at DESC
+    LIMIT ?
+"""
+SQL_GET_REQUESTS = """
+    SELECT r.id, r.patient_id, r.request_type, r.status, r.created_at,
+           r.appointment_date, r.notes, p.name as patient_name
+    FROM requests r LEFT JOIN patients p ON r.patient_id = p.id
+    ORDER BY r.created_at DESC
+    LIMIT ?
+"""
+SQL_ALL_PATIENTS = "SELECT id, name, age, gender, language FROM patients ORDER BY id LIMIT ? OFFSET ?"
+SQL_CLOSE_REQUEST = "UPDATE requests SET status = 'closed' WHERE id = ?"
+
+
+@st.cache_data(ttl=300)
+def load_patient_data(patient_id):
+    conn = get_db_connection()
+    patient = conn.execute(SQL_GET_PATIENT, (patient_id,)).fetchone()
+    
+    if patient:
+        data = dict(patient)
+        # Decode the JSON columns here so callers work with plain lists;
+        # legacy rows may hold NULL or malformed values
+        try:
+            data['pre_conditions'] = jloads(data.get('pre_conditions') or '[]')
+        except ValueError:
+            data['pre_conditions'] = []
+        try:
+            data['symptoms'] = jloads(data.get('symptoms') or '[]')
+        except ValueError:
+            data['symptoms'] = []
+        # The newest consultation rides along on the same query; reshape
+        # it into the dict the Medication tab renders
+        rx_raw = data.pop('latest_prescription', None)
+        rx_date = data.pop('latest_consultation_date', None)
+        rx_diagnosis = data.pop('latest_diagnosis', None)
+        if rx_raw is not None or rx_date is not None or rx_diagnosis is not None:
+            # Parse prescription from JSON if it's stored as JSON,
+            # otherwise keep the raw prescription text
+            try:
+                prescription = jloads(rx_raw)
+            except (ValueError, TypeError):
+                prescription = rx_raw
+            data['_latest_prescription'] = {
+                'prescription': prescription,
+                'date': rx_date,
+                'diagnosis': rx_diagnosis
+            }
+        else:
+            data['_latest_prescription'] = None
+        # Prefill strings for the custom-entry text areas, computed once
+        # per load instead of on every form rerun
+        data['_custom_conditions_str'] = ", ".join(
+            c for c in data['pre_conditions'] if c not in COMMON_CONDITIONS_SET)
+        data['_custom_symptoms_str'] = ", ".join(
+            sym for sym in data['symptoms'] if sym not in COMMON_SYMPTOMS_SET)
+        return data
+    return None
+
+def save_patient_data(patient_data):
+    conn = get_db_connection()
+    
+    # Single UPSERT instead of an exists-check followed by UPDATE/INSERT:
+    # one prepared statement, and no race between the check and the write.
+    # The with-block commits on success and rolls back on exception.
+    with _write_lock, conn:
+        conn.execute(SQL_UPSERT_PATIENT, (
+            patient_data['id'], 
+            patient_data['name'], 
+            patient_data['age'], 
+            patient_data['gender'],
+            jdumps(patient_data['pre_conditions']),
+            patient_data['language'],
+            patient_data.get('temperature', ''),
+            patient_data.get('blood_pressure', ''),
+            patient_data.get('heart_rate', ''),
+            patient_data.get('respiratory_rate', ''),
+            patient_data.get('oxygen_saturation', ''),
+            jdumps(patient_data.get('symptoms', []))
+        ))
+    
+    # Drop cached reads so the saved data is visible immediately
+    load_patient_data.clear()
+    all_patients.clear()
+    return True
+
+@st.cache_data(ttl=30)
+def get_requests(status=None, limit=50):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # Newest first, bounded by limit so the monitor never materializes the
+    # whole requests table
+    if status:
+        rows = cursor.execute(SQL_GET_REQUESTS_STATUS, (status, limit)).fetchall()
+    else:
+        rows = cursor.execute(SQL_GET_REQUESTS, (limit,)).fetchall()
+        
+    return [dict(row) for row in rows]
+
+PATIENTS_PAGE_SIZE = 50
+
+@st.cache_data(ttl=60)
+def all_patients(offset, limit):
+    # fetchall + from_records skips pandas' SQL adapter and its per-call
+    # dtype machinery; the schema is fixed so it buys nothing here
+    conn = get_db_connection()
+    rows = conn.execute(SQL_ALL_PATIENTS, (limit, offset)).fetchall()
+    return pd.DataFrame.from_records(rows, columns=["id", "name", "age", "gender", "language"])
+
+def close_request(request_ids):
+    # Accepts a single id or a list; the whole batch commits in one
+    # transaction, so a bulk close costs one fsync instead of one per row
+    if not isinstance(request_ids, (list, tuple)):
+        request_ids = [request_ids]
+    conn = get_db_connection()
+    with _write_lock, conn:
+        conn.executemany(SQL_CLOSE_REQUEST, [(rid,) for rid in request_ids])
+    # Drop cached request lists so the closed status shows up right away
+    get_requests.clear()
+    return True
@@ -1,84 +1,60 @@
 import streamlit as st
-import sqlite3
 import pandas as pd
-import os
-from dotenv import load_dotenv
-import json
-import time
+import numpy as np
+import re
 from datetime import datetime
 
-# Load environment variables for local development
-load_dotenv()
+from patient_db import (
+    COMMON_CONDITIONS, COMMON_CONDITIONS_SET, COMMON_SYMPTOMS,
+    PATIENTS_PAGE_SIZE, all_patients, close_request, get_requests,
+    load_patient_data, save_patient_data,
+)
 
-# Database connection - prioritize Streamlit secrets for cloud deployment
-try:
-    # Try to get DB path from Streamlit secrets (for cloud deployment)
-    DB_PATH = st.secrets.get("DATABASE_PATH", "muawin.db")
-except (AttributeError, FileNotFoundError):
-    # Fall back to environment variables or local path (for local development)
-    DB_PATH = os.getenv('DATABASE_PATH', 'muawin.db')
+# Selectbox options, hoisted out of the render path
+GENDERS = ("Male", "Female", "Other")
+GENDER_INDEX = {g: i for i, g in enumerate(GENDERS)}
+LANGUAGES = ("English", "Urdu", "Punjabi", "Other")
+LANGUAGE_INDEX = {l: i for i, l in enumerate(LANGUAGES)}
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Fixed schema for text-format prescriptions, so DataFrame construction
+# skips per-row key-union inference
+PRESCRIPTION_COLS = ["Medication", "Dosage", "Frequency", "Duration", "Side Effects"]
 
-# Common health conditions for checkboxes
-COMMON_CONDITIONS = [
-     "Diabetes", "Hypertension", "Asthma", "COPD", "Heart Disease", 
-            "Stroke", "Cancer", "Arthritis", "Depression", "Anxiety", 
-            "Thyroid Disorder", "Kidney Disease", "Liver Disease", "Obesity",
-            "Allergies", "Epilepsy"
-]
+# Precompiled patterns for the text-prescription parser. _PRESC_RE
+# captures one prescription line in a single match: optional bullet or
+# numbering, then Medication - Dosage - Frequency - Duration with an
+# optional trailing "(Side effects: ...)".
+_DIGITS_RE = re.compile(r'\d+')
+_PRESC_RE = re.compile(
+    r'^[ \t]*(?:•|\*\s|-\s|\d+[.)]\s*)?'
+    r'(?P<med>.+?)'
+    r'(?: - (?P<dose>.+?))?'
+    r'(?: - (?P<freq>.+?))?'
+    r'(?: - (?P<dur>[^()]+?)(?:\s*\(Side effects:\s*(?P<se>[^)]*)\))?)?'
+    r'[ \t]*$',
+    re.M)
 
-# Common symptoms for checkboxes
-COMMON_SYMPTOMS = [
-    "Fever", "Headache", "Cough", "Sore Throat", "Fatigue", "Nausea",
-    "Vomiting", "Diarrhea", "Abdominal Pain", "Chest Pain", "Shortness of Breath",
-    "Dizziness", "Rash", "Joint Pain", "Back Pain", "Sweating", "Chills"
-]
-
-# Function to get latest prescription for a patient
-def get_latest_prescription(patient_id):
-    conn = get_db_connection()
-    query = """
-        SELECT prescription, consultation_date, diagnosis 
-        FROM consultations 
-        WHERE patient_id = ? 
-        ORDER BY consultation_date DESC 
-        LIMIT 1
-    """
-    result = conn.execute(query, (patient_id,)).fetchone()
-    conn.close()
-    
-    if result:
-        # Parse prescription from JSON if it's stored as JSON, otherwise return as is
-        try:
-            prescription = json.loads(result['prescription'])
-        except (json.JSONDecodeError, TypeError):
-            # If not valid JSON, return the raw prescription text
-            prescription = result['prescription']
-        
-        return {
-            'prescription': prescription,
-            'date': result['consultation_date'],
-            'diagnosis': result['diagnosis']
-        }
-    
-    return None
-
-# Function to format prescription data into a displayable table
+# Parse a prescription once into its displayable table, the medication
+# names and the estimated required quantities. Cached so the Medication
+# tab pays the parsing cost only when the prescription changes.
+@st.cache_data
 def format_prescription_table(prescription_data):
+    medications = []
+    prescribed_quantities = {}
+    
     if isinstance(prescription_data, list):
         # Handle prescription in list format
         formatted_data = []
         for item in prescription_data:
             if isinstance(item, dict):
                 formatted_data.append(item)
+                if 'Medication' in item:
+                    medications.append(item['Medication'])
             else:
                 formatted_data.append({"Medication": item})
+                medications.append(item)
         
-        return pd.DataFrame(formatted_data)
+        return pd.DataFrame(formatted_data), medications, prescribed_quantities
     
     elif isinstance(prescription_data, dict):
         # Handle prescription in dictionary format
@@ -89,165 +65,103 @@ def format_prescription_table(prescription_data):
             else:
                 entry = {"Medication": medication, "Instructions": details}
             formatted_data.append(entry)
+        medications = list(prescription_data.keys())
         
-        return pd.DataFrame(formatted_data)
+        return pd.DataFrame(formatted_data), medications, prescribed_quantities
     
     else:
         # Handle text-based prescription format with bullet points
         if isinstance(prescription_data, str):
-            # Split the prescription into lines
-            lines = prescription_data.strip().split('\n')
+            text = prescription_data.strip()
             
-            # Remove the "PRESCRIPTION:" header if present
-            if lines and "PRESCRIPTION:" in lines[0]:
-                lines = lines[2:]  # Skip header and blank line
-                
-            formatted_data = []
+            # Remove the "PRESCRIPTION:" header line if present
+            first_newline = text.find('\n')
+            if first_newline != -1 and "PRESCRIPTION:" in text[:first_newline]:
+                text = text[first_newline + 1:]
+            elif first_newline == -1 and "PRESCRIPTION:" in text:
+                text = ''
             
-            for line in lines:
-                line = line.strip()
-                if not line or line == "":
+            # One regex pass over the whole blob instead of a per-line
+            # strip/split loop; blank lines simply don't match
+            formatted_data = []
+            for match in _PRESC_RE.finditer(text):
+                medication_name = match.group('med').strip()
+                if not medication_name:
                     continue
-                    
-                # Remove bullet point if present
-                if line.startswith('•') or line.startswith('* ') or line.startswith('- '):
-                    line = line[2:].strip()
-                elif line.startswith('1.') or line.startswith('2.'):  # Handle numbered lists
-                    line = line[line.find('.')+1:].strip()
-                    
-                # Parse the components based on the typical format
-                # Medication - Dosage - Frequency - Duration (Side effects: list of side effects)
-                parts = line.split(' - ')
-                med_data = {}
                 
-                if len(parts) >= 1:
-                    med_data["Medication"] = parts[0].strip()
-                
-                if len(parts) >= 2:
-                    med_data["Dosage"] = parts[1].strip()
-                    
-                if len(parts) >= 3:
-                    med_data["Frequency"] = parts[2].strip()
-                    
-                if len(parts) >= 4:
-                    # Handle side effects that are in parentheses 
-                    duration_parts = parts[3].split('(Side effects:', 1)
-                    med_data["Duration"] = duration_parts[0].strip()
-                    
-                    if len(duration_parts) > 1:
-                        side_effects = duration_parts[1].strip()
-                        if side_effects.endswith(')'):
-                            side_effects = side_effects[:-1]
-                        med_data["Side Effects"] = side_effects
+                med_data = {"Medication": medication_name}
+                dose, freq, dur, se = match.group('dose', 'freq', 'dur', 'se')
+                if dose:
+                    med_data["Dosage"] = dose.strip()
+                if freq:
+                    med_data["Frequency"] = freq.strip()
+                if dur:
+                    med_data["Duration"] = dur.strip()
+                if se is not None:
+                    med_data["Side Effects"] = se.strip()
                 
+                medications.append(medication_name)
+                prescribed_quantities[medication_name] = _estimate_quantity(dose, freq, dur)
                 formatted_data.append(med_data)
             
-            return pd.DataFrame(formatted_data) if formatted_data else pd.DataFrame({"Medication": ["No medications found"]})
+            if formatted_data:
+                df = pd.DataFrame.from_records(formatted_data, columns=PRESCRIPTION_COLS)
+            else:
+                df = pd.DataFrame({"Medication": ["No medications found"]})
+            return df, medications, prescribed_quantities
         
         # Fallback for other formats
-        return pd.DataFrame({"Prescription": [prescription_data]})
+        return pd.DataFrame({"Prescription": [prescription_data]}), medications, prescribed_quantities
 
-def load_patient_data(patient_id):
-    conn = get_db_connection()
-    query = "SELECT * FROM patients WHERE id = ?"
-    patient = conn.execute(query, (patient_id,)).fetchone()
-    conn.close()
-    
-    if patient:
-        return dict(patient)
-    return None
-
-def save_patient_data(patient_data):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Check if patient exists
-    exists = cursor.execute("SELECT 1 FROM patients WHERE id = ?", (patient_data['id'],)).fetchone()
+# Estimate the units needed for one parsed prescription line
+# (dosage digits -> units per day from the frequency wording x days from
+# the duration wording; defaults mirror the old inventory parser)
+def _estimate_quantity(dose, freq, dur):
+    if not dose or not _DIGITS_RE.search(dose):
+        return 5
+    if not freq:
+        return 7  # Default to a week's supply
+    frequency_part = freq.lower()
+    # Calculate units needed based on frequency phrases
+    units = 1
+    if "three times" in frequency_part or "3 times" in frequency_part:
+        units = 3
+    elif "twice" in frequency_part or "two times" in frequency_part or "2 times" in frequency_part:
+        units = 2
     
-    if exists:
-        # Update existing patient
-        cursor.execute("""
-            UPDATE patients 
-            SET name = ?, age = ?, gender = ?, pre_conditions = ?, language = ?,
-                temperature = ?, blood_pressure = ?, heart_rate = ?, 
-                respiratory_rate = ?, oxygen_saturation = ?, symptoms = ?
-            WHERE id = ?
-        """, (
-            patient_data['name'], 
-            patient_data['age'], 
-            patient_data['gender'],
-            patient_data['pre_conditions'],
-            patient_data['language'],
-            patient_data.get('temperature', ''),
-            patient_data.get('blood_pressure', ''),
-            patient_data.get('heart_rate', ''),
-            patient_data.get('respiratory_rate', ''),
-            patient_data.get('oxygen_saturation', ''),
-            patient_data.get('symptoms', ''),
-            patient_data['id']
-        ))
-    else:
-        # Insert new patient
-        cursor.execute("""
-            INSERT INTO patients (
-                id, name, age, gender, pre_conditions, language,
-                temperature, blood_pressure, heart_rate, 
-                respiratory_rate, oxygen_saturation, symptoms
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            patient_data['id'], 
-            patient_data['name'], 
-            patient_data['age'], 
-            patient_data['gender'],
-            patient_data['pre_conditions'],
-            patient_data['language'],
-            patient_data.get('temperature', ''),
-            patient_data.get('blood_pressure', ''),
-            patient_data.get('heart_rate', ''),
-            patient_data.get('respiratory_rate', ''),
-            patient_data.get('oxygen_saturation', ''),
-            patient_data.get('symptoms', '')
-        ))
-    
-    conn.commit()
-    conn.close()
-    return True
-
-def get_requests(status=None):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    if status:
-        query = "SELECT r.*, p.name as patient_name FROM requests r LEFT JOIN patients p ON r.patient_id = p.id WHERE r.status = ?"
-        rows = cursor.execute(query, (status,)).fetchall()
-    else:
-        query = "SELECT r.*, p.name as patient_name FROM requests r LEFT JOIN patients p ON r.patient_id = p.id"
-        rows = cursor.execute(query).fetchall()
-        
-    conn.close()
-    return [dict(row) for row in rows]
-
-def close_request(request_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("UPDATE requests SET status = 'closed' WHERE id = ?", (request_id,))
+    # Extract duration information
+    duration_days = 7  # Default to a week
+    if dur:
+        duration_part = dur.lower()
+        duration_numbers = _DIGITS_RE.findall(duration_part)
+        if duration_numbers and "day" in duration_part:
+            try:
+                duration_days = int(duration_numbers[0])
+            except ValueError:
+                pass
+        elif "week" in duration_part and duration_numbers:
+            try:
+                duration_days = int(duration_numbers[0]) * 7
+            except ValueError:
+                pass
     
-    conn.commit()
-    conn.close()
-    return True
+    return units * duration_days
 
-# Initialize session state for auto-refresh
-if 'last_refresh' not in st.session_state:
-    st.session_state.last_refresh = time.time()
-    st.session_state.refresh_interval = 30  # Refresh every 30 seconds
+# Logo bytes cached once so reruns don't re-read the PNG from disk
+@st.cache_data
+def _logo_bytes():
+    with open("Muawin_logo.png", "rb") as f:
+        return f.read()
 
 # App title and logo
 st.set_page_config(page_title="Patient Information", layout="wide")
 
 # Display title
-st.title("Patient Information")
+logo_col, title_col = st.columns([1, 8])
+with logo_col:
+    st.image(_logo_bytes(), width=100)
+with title_col:
+    st.title("Patient Information")
 
 # Create tabs for patient info, medication, and requests
 tab1, tab2, tab3 = st.tabs(["Patient Information", "Patient Medication", "Requests Monitor"])
@@ -267,7 +181,7 @@ with col2:
                     'name': '',
                     'age': 0,
                     'gender': '',
-                    'pre_conditions': '[]',
+                    'pre_conditions': [],
                     'language': 'English'
                 }
         else:
@@ -288,10 +202,10 @@ with tab1:
                 age = st.number_input("Age", min_value=0, max_value=120, value=int(patient.get('age', 0)))
             
             with col2:
-                gender = st.selectbox("Gender", ["Male", "Female", "Other"], 
-                                    index=["Male", "Female", "Other"].index(patient.get('gender', 'Male')) if patient.get('gender') in ["Male", "Female", "Other"] else 0)
-                language = st.selectbox("Preferred Language", ["English", "Urdu", "Punjabi", "Other"], 
-                                      index=["English", "Urdu", "Punjabi", "Other"].index(patient.get('language', 'English')) if patient.get('language') in ["English", "Urdu", "Punjabi", "Other"] else 0)
+                gender = st.selectbox("Gender", GENDERS, 
+                                    index=GENDER_INDEX.get(patient.get('gender'), 0))
+                language = st.selectbox("Preferred Language", LANGUAGES, 
+                                      index=LANGUAGE_INDEX.get(patient.get('language'), 0))
             
             # Vitals section
             st.subheader("Vital Signs")
@@ -311,65 +225,57 @@ with tab1:
             # Symptoms section
             st.subheader("Symptoms")
             
-            # Parse existing symptoms from JSON string or initialize empty list
-            try:
-                # Convert None to '[]' before parsing
-                symptoms_str = patient.get('symptoms', '[]')
-                if symptoms_str is None:
-                    symptoms_str = '[]'
-                existing_symptoms = json.loads(symptoms_str)
-            except json.JSONDecodeError:
-                existing_symptoms = []
-                
+            existing_symptoms = patient.get('symptoms') or []
+            
+            # Seed the checkbox state once per loaded patient; afterwards
+            # Streamlit carries the toggles in session state itself, so no
+            # per-rerun value= recomputation is needed
+            if st.session_state.get('symptoms_seeded_for') != patient['id']:
+                existing_symptoms_set = set(existing_symptoms)
+                for symptom in COMMON_SYMPTOMS:
+                    st.session_state[f"symptom_{symptom}"] = symptom in existing_symptoms_set
+                st.session_state.symptoms_seeded_for = patient['id']
+            
             # Checkboxes for common symptoms
             symptom_cols = st.columns(3)
             selected_symptoms = []
             
             for i, symptom in enumerate(COMMON_SYMPTOMS):
                 with symptom_cols[i % 3]:
-                    if st.checkbox(symptom, value=symptom in existing_symptoms, key=f"symptom_{symptom}"):
+                    if st.checkbox(symptom, key=f"symptom_{symptom}"):
                         selected_symptoms.append(symptom)
             
             # Custom symptom input
             st.write("Add custom symptoms (if not listed above):")
             custom_symptoms = st.text_area("Enter symptoms separated by commas", 
-                                        value=", ".join([s for s in existing_symptoms if s not in COMMON_SYMPTOMS]),
+                                        value=patient.get('_custom_symptoms_str', ''),
                                         height=100)
             
             # Pre-existing conditions
             st.subheader("Pre-existing Conditions")
             
-            # Parse existing conditions from JSON string or initialize empty list
-            try:
-                existing_conditions = json.loads(patient.get('pre_conditions', '[]'))
-            except json.JSONDecodeError:
-                existing_conditions = []
+            existing_conditions = patient.get('pre_conditions') or []
                 
-            # Checkboxes for common conditions
-            condition_cols = st.columns(3)
-            selected_conditions = []
-            
-            for i, condition in enumerate(COMMON_CONDITIONS):
-                with condition_cols[i % 3]:
-                    if st.checkbox(condition, value=condition in existing_conditions):
-                        selected_conditions.append(condition)
+            # One multiselect instead of 16 checkbox widgets across 3 columns
+            selected_conditions = st.multiselect("Common conditions", COMMON_CONDITIONS,
+                                                 default=[c for c in existing_conditions if c in COMMON_CONDITIONS_SET])
             
             # Custom condition input
             st.write("Add custom conditions (if not listed above):")
             custom_conditions = st.text_area("Enter conditions separated by commas", 
-                                            value=", ".join([c for c in existing_conditions if c not in COMMON_CONDITIONS]),
+                                            value=patient.get('_custom_conditions_str', ''),
                                             height=100)
             
             # Save button
             submit = st.form_submit_button("Save Patient Information")
             
             if submit:
-                # Process custom conditions
-                if custom_conditions.strip():
-                    custom_list = [c.strip() for c in custom_conditions.split(',') if c.strip()]
-                    all_conditions = selected_conditions + custom_list
-                else:
-                    all_conditions = selected_conditions
+                # Process custom conditions, dropping blanks, duplicates and
+                # entries already covered by the common list
+                raw_conditions = (c.strip() for c in custom_conditions.split(',')) if custom_conditions.strip() else ()
+                custom_list = list(dict.fromkeys(
+                    c for c in raw_conditions if c and c not in COMMON_CONDITIONS_SET))
+                all_conditions = list(dict.fromkeys([*selected_conditions, *custom_list]))
                 
                 # Process custom symptoms
                 if custom_symptoms.strip():
@@ -384,14 +290,19 @@ with tab1:
                     'name': name,
                     'age': age,
                     'gender': gender,
-                    'pre_conditions': json.dumps(all_conditions),
+                    'pre_conditions': all_conditions,
                     'language': language,
                     'temperature': temperature,
                     'blood_pressure': blood_pressure,
                     'heart_rate': heart_rate,
                     'respiratory_rate': respiratory_rate,
                     'oxygen_saturation': oxygen_saturation,
-                    'symptoms': json.dumps(all_symptoms)
+                    'symptoms': all_symptoms,
+                    '_custom_conditions_str': ", ".join(custom_list),
+                    '_custom_symptoms_str': ", ".join(custom_symptom_list) if custom_symptoms.strip() else '',
+                    # Saving doesn't change the consultation history, so the
+                    # prescription loaded with the patient stays valid
+                    '_latest_prescription': patient.get('_latest_prescription')
                 }
                 
                 if save_patient_data(updated_patient):
@@ -404,8 +315,8 @@ with tab2:
     if 'current_patient' in st.session_state:
         patient = st.session_state.current_patient
         
-        # Get and display latest prescription for this patient
-        latest_prescription = get_latest_prescription(patient['id'])
+        # The latest prescription came along with the patient load
+        latest_prescription = patient.get('_latest_prescription')
         if latest_prescription:
             st.subheader("Latest Prescription")
             
@@ -413,127 +324,39 @@ with tab2:
             st.write(f"**Date:** {latest_prescription['date']}")
             st.write(f"**Diagnosis:** {latest_prescription['diagnosis'] or 'Not specified'}")
             
-            # Format prescription as a table based on its structure
-            prescription_df = format_prescription_table(latest_prescription['prescription'])
+            # One pass parses the table, the medication names and the
+            # required quantities
+            prescription_df, medications, prescribed_quantities = format_prescription_table(latest_prescription['prescription'])
             st.table(prescription_df)
             
             # Display inventory simulation section
             st.subheader("Inventory Status")
             
-            # Extract medication names based on prescription format
-            medications = []
-            prescribed_quantities = {}
+            # Generate inventory status for each medication in one
+            # vectorized pass instead of a per-medication Python loop
+            meds = [m for m in medications if m]  # Skip empty medication names
             
-            if isinstance(latest_prescription['prescription'], list):
-                # Handle list format
-                for item in latest_prescription['prescription']:
-                    if isinstance(item, dict) and 'Medication' in item:
-                        medications.append(item['Medication'])
-                    elif isinstance(item, str):
-                        medications.append(item)
-            elif isinstance(latest_prescription['prescription'], dict):
-                # Handle dictionary format
-                medications = list(latest_prescription['prescription'].keys())
-            elif isinstance(latest_prescription['prescription'], str):
-                # Handle text format - extract medication names from the first part of each line
-                lines = latest_prescription['prescription'].strip().split('\n')
-                
-                # Skip "PRESCRIPTION:" header if present
-                if lines and "PRESCRIPTION:" in lines[0]:
-                    lines = lines[2:]  # Skip header and blank line
-                
-                for line in lines:
-                    line = line.strip()
-                    if not line:
-                        continue
-                        
-                    # Remove bullet point or numbering if present
-                    if line.startswith('•') or line.startswith('* ') or line.startswith('- '):
-                        line = line[2:].strip()
-                    elif line[0].isdigit() and line[1:3] in ['. ', ') ']:
-                        line = line[3:].strip()
-                        
-                    # Extract medication name (first part before any ' - ')
-                    parts = line.split(' - ')
-                    if parts:
-                        medication_name = parts[0].strip()
-                        medications.append(medication_name)
-                        
-                        # Try to parse quantity from dosage information (e.g., "500mg" -> 500)
-                        if len(parts) >= 2:
-                            dosage_part = parts[1].strip()
-                            import re
-                            # Extract numbers from dosage (e.g. "500mg" -> 500)
-                            dosage_numbers = re.findall(r'\d+', dosage_part)
-                            if dosage_numbers:
-                                try:
-                                    dosage_num = int(dosage_numbers[0])
-                                    # Extract frequency information
-                                    if len(parts) >= 3:
-                                        frequency_part = parts[2].lower()
-                                        # Calculate units needed based on frequency phrases
-                                        units = 1
-                                        if "three times" in frequency_part or "3 times" in frequency_part:
-                                            units = 3
-                                        elif "twice" in frequency_part or "two times" in frequency_part or "2 times" in frequency_part:
-                                            units = 2
-                                        
-                                        # Extract duration information
-                                        duration_days = 7  # Default to a week
-                                        if len(parts) >= 4:
-                                            duration_part = parts[3].lower()
-                                            duration_numbers = re.findall(r'\d+', duration_part)
-                                            if duration_numbers and "day" in duration_part:
-                                                try:
-                                                    duration_days = int(duration_numbers[0])
-                                                except ValueError:
-                                                    pass
-                                            elif "week" in duration_part and duration_numbers:
-                                                try:
-                                                    duration_days = int(duration_numbers[0]) * 7
-                                                except ValueError:
-                                                    pass
-                                        
-                                        # Calculate total quantity needed
-                                        prescribed_quantities[medication_name] = units * duration_days
-                                    else:
-                                        prescribed_quantities[medication_name] = 7  # Default to a week's supply
-                                except ValueError:
-                                    prescribed_quantities[medication_name] = 5  # Default quantity if parsing fails
-                            else:
-                                prescribed_quantities[medication_name] = 5  # Default quantity
-                        else:
-                            prescribed_quantities[medication_name] = 5  # Default quantity
-            
-            # Generate inventory status for each medication
-            import random
-            inventory_data = []
-            
-            if medications:
-                for med in medications:
-                    if med:  # Skip empty medication names
-                        available_quantity = random.randint(0, 30)  # Simulate inventory quantity
-                        required_quantity = prescribed_quantities.get(med, 5)  # Get required quantity or default to 5
-                        status = "In Stock" if available_quantity >= required_quantity else "Low Stock" if available_quantity > 0 else "Out of Stock"
-                        
-                        inventory_data.append({
-                            "Medication": med,
-                            "Available Quantity": available_quantity,
-                            "Required Quantity": required_quantity,
-                            "Status": status
-                        })
+            if meds:
+                n = len(meds)
+                available = np.random.randint(0, 31, size=n)  # Simulate inventory quantities
+                required = np.fromiter((prescribed_quantities.get(m, 5) for m in meds),
+                                       dtype=np.int32, count=n)
+                status = np.where(available >= required, "In Stock",
+                                  np.where(available > 0, "Low Stock", "Out of Stock"))
                 
                 # Display inventory table
-                if inventory_data:
-                    inventory_df = pd.DataFrame(inventory_data)
-                    st.table(inventory_df)
-                    
-                    # Alert for low stock items
-                    low_stock = [item for item in inventory_data if item['Status'] != "In Stock"]
-                    if low_stock:
-                        st.warning(f"Warning: {len(low_stock)} medication(s) need to be restocked!")
-                else:
-                    st.info("No inventory data available.")
+                inventory_df = pd.DataFrame({
+                    "Medication": meds,
+                    "Available Quantity": available,
+                    "Required Quantity": required,
+                    "Status": status
+                })
+                st.table(inventory_df)
+                
+                # Alert for low stock items
+                low_stock_count = int((status != "In Stock").sum())
+                if low_stock_count:
+                    st.warning(f"Warning: {low_stock_count} medication(s) need to be restocked!")
             else:
                 st.info("No medications found to check inventory status.")
         else:
@@ -541,21 +364,15 @@ with tab2:
     else:
         st.info("Please select a patient first by entering a Patient ID above.")
 
-with tab3:
-    st.subheader("Patient Requests Monitor")
-    
-    # Auto-refresh mechanism
-    current_time = time.time()
-    if current_time - st.session_state.last_refresh > st.session_state.refresh_interval:
-        st.session_state.last_refresh = current_time
-        st.rerun()
-    
-    # Display time until next refresh
-    time_left = int(st.session_state.refresh_interval - (current_time - st.session_state.last_refresh))
-    st.caption(f"Auto-refreshing in {time_left} seconds. Last refreshed at {datetime.now().strftime('%H:%M:%S')}")
+# Only this fragment re-runs on the 30s tick (and on its own widgets),
+# so a refresh no longer re-executes the form, the medication tab or the
+# sidebar query
+@st.fragment(run_every=30)
+def requests_panel():
+    st.caption(f"Auto-refreshing every 30 seconds. Last refreshed at {datetime.now().strftime('%H:%M:%S')}")
     
     if st.button("Refresh Now"):
-        st.session_state.last_refresh = current_time
+        get_requests.clear()
         st.rerun()
     
     # Filter options with "All" as the default (changed from index=1 to index=0)
@@ -567,39 +384,49 @@ with tab3:
     else:
         requests = get_requests(request_status)
     
-    # Display requests in expandable sections
+    # Display requests as one table; details render only for the selected row
     if not requests:
         st.info("No requests found with the selected status.")
     else:
-        for req in requests:
-            with st.expander(f"Request #{req['id']} - {req['request_type']} - {req['status']}"):
-                cols = st.columns(2)
-                
-                with cols[0]:
-                    st.write(f"**Patient:** {req['patient_name']} (ID: {req['patient_id']})")
-                    st.write(f"**Type:** {req['request_type']}")
-                    st.write(f"**Created:** {req['created_at']}")
-                    
-                with cols[1]:
-                    st.write(f"**Status:** {req['status']}")
-                    if req['appointment_date']:
-                        st.write(f"**Appointment:** {req['appointment_date']}")
-                    st.write(f"**Notes:** {req['notes'] or 'No notes'}")
-                
-                # Action buttons
-                if req['status'] != 'closed':
-                    if st.button("Close Request", key=f"close_{req['id']}"):
-                        if close_request(req['id']):
-                            st.success(f"Request #{req['id']} has been closed.")
-                            st.rerun()
-                        else:
-                            st.error("Error closing the request.")
+        requests_df = pd.DataFrame(requests,
+                                   columns=["id", "patient_name", "patient_id", "request_type",
+                                            "status", "created_at", "appointment_date", "notes"])
+        selection = st.dataframe(requests_df, use_container_width=True, hide_index=True,
+                                 selection_mode="multi-row", on_select="rerun")
+        
+        selected = [requests[i] for i in selection.selection.rows]
+        for req in selected:
+            st.write(f"**Patient:** {req['patient_name']} (ID: {req['patient_id']})")
+            st.write(f"**Created:** {req['created_at']}")
+            if req['appointment_date']:
+                st.write(f"**Appointment:** {req['appointment_date']}")
+            st.write(f"**Notes:** {req['notes'] or 'No notes'}")
+        
+        # Batch the close actions: all selected rows close in one call and
+        # one rerun instead of a button (and rerun) per request
+        selected_open_ids = [req['id'] for req in selected if req['status'] != 'closed']
+        if selected_open_ids and st.button("Close Selected"):
+            if close_request(selected_open_ids):
+                st.success(f"Closed {len(selected_open_ids)} request(s).")
+                st.rerun()
+            else:
+                st.error("Error closing the requests.")
+        
+        open_ids = [req['id'] for req in requests if req['status'] != 'closed']
+        if open_ids and st.button("Close All Visible"):
+            if close_request(open_ids):
+                st.success(f"Closed {len(open_ids)} request(s).")
+                st.rerun()
+            else:
+                st.error("Error closing the requests.")
+
+with tab3:
+    st.subheader("Patient Requests Monitor")
+    requests_panel()
 
 # Add viewing of all patients
 if st.sidebar.checkbox("View All Patients"):
-    conn = get_db_connection()
-    patients_df = pd.read_sql_query("SELECT id, name, age, gender, language FROM patients", conn)
-    conn.close()
-    
     st.sidebar.subheader("Patient List")
+    page = st.sidebar.number_input("Page", min_value=1, value=1, step=1)
+    patients_df = all_patients((page - 1) * PATIENTS_PAGE_SIZE, PATIENTS_PAGE_SIZE)
     st.sidebar.dataframe(patients_df)
\ No newline at end of file
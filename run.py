@@ -4,9 +4,11 @@ Launcher script for Patient Information System
 Runs the Streamlit app on port 8502
 """
 
-import os
 import sys
 
+from streamlit.web import cli as stcli
+
 if __name__ == "__main__":
-    # Run the Streamlit app on port 8502
-    os.system(f"streamlit run patient_info.py --server.port=8502")
\ No newline at end of file
+    # Invoke Streamlit's CLI directly instead of forking a shell
+    sys.argv = ["streamlit", "run", "patient_info.py", "--server.port=8502"]
+    sys.exit(stcli.main())